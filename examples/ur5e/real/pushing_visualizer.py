@@ -49,7 +49,7 @@ def main():
     pts, colors = robot.cam.get_pcd(in_world=True,
                                     filter_depth=True)
     pts, colors = filter_points(pts, colors, z_lowest=args.z_min)
-    pcd.points = open3d.utility.Vector3dVector(pts)
+    pcd.points = open3d.utility.Vector3dVector(pts.astype(np.float64))
     pcd.colors = open3d.utility.Vector3dVector(colors / 255.0)
     coord = open3d.geometry.TriangleMesh.create_coordinate_frame(1, [0, 0, 0])
     vis.add_geometry(coord)
@@ -58,7 +58,7 @@ def main():
         pts, colors = robot.cam.get_pcd(in_world=True,
                                         filter_depth=True)
         pts, colors = filter_points(pts, colors, z_lowest=args.z_min)
-        pcd.points = open3d.utility.Vector3dVector(pts)
+        pcd.points = open3d.utility.Vector3dVector(pts.astype(np.float64))
         pcd.colors = open3d.utility.Vector3dVector(colors / 255.0)
         vis.update_geometry()
         vis.poll_events()
@@ -2,6 +2,7 @@ import signal
 import sys
 import time
 
+import numpy as np
 import open3d
 from airobot import Robot
 from airobot.utils.ros_util import read_cam_ext
@@ -32,13 +33,13 @@ def main():
     pcd = open3d.geometry.PointCloud()
     pts, colors = robot.cam.get_pcd(in_world=True,
                                     filter_depth=False)
-    pcd.points = open3d.utility.Vector3dVector(pts)
+    pcd.points = open3d.utility.Vector3dVector(pts.astype(np.float64))
     pcd.colors = open3d.utility.Vector3dVector(colors / 255.0)
     vis.add_geometry(pcd)
     while True:
         pts, colors = robot.cam.get_pcd(in_world=True,
                                         filter_depth=False)
-        pcd.points = open3d.utility.Vector3dVector(pts)
+        pcd.points = open3d.utility.Vector3dVector(pts.astype(np.float64))
         pcd.colors = open3d.utility.Vector3dVector(colors / 255.0)
         vis.update_geometry()
         vis.poll_events()
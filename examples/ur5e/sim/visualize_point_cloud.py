@@ -2,6 +2,7 @@ import signal
 import sys
 import time
 
+import numpy as np
 import open3d
 from airobot import Robot
 
@@ -36,14 +37,14 @@ def main():
     pts, colors = robot.cam.get_pcd(in_world=True,
                                     filter_depth=True,
                                     depth_max=depth_max)
-    pcd.points = open3d.utility.Vector3dVector(pts)
+    pcd.points = open3d.utility.Vector3dVector(pts.astype(np.float64))
     pcd.colors = open3d.utility.Vector3dVector(colors / 255.0)
     vis.add_geometry(pcd)
     while True:
         pts, colors = robot.cam.get_pcd(in_world=True,
                                         filter_depth=True,
                                         depth_max=depth_max)
-        pcd.points = open3d.utility.Vector3dVector(pts)
+        pcd.points = open3d.utility.Vector3dVector(pts.astype(np.float64))
         pcd.colors = open3d.utility.Vector3dVector(colors / 255.0)
         vis.update_geometry()
         vis.poll_events()
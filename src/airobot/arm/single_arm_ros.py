@@ -8,7 +8,6 @@ from __future__ import print_function
 import copy
 import numbers
 import sys
-import threading
 
 import airobot.utils.common as arutil
 import moveit_commander
@@ -206,17 +205,16 @@ class SingleArmROS(SingleArmReal):
               (shape: :math:`[DOF]`).
 
         """
-        self._j_state_lock.acquire()
+        j_pos = self._j_pos
         if joint_name is not None:
             if joint_name not in self.arm_jnt_names:
                 raise TypeError('Joint name [%s] '
                                 'not recognized!' % joint_name)
-            jpos = self._j_pos[joint_name]
+            jpos = j_pos[joint_name]
         else:
             jpos = []
             for joint in self.arm_jnt_names:
-                jpos.append(self._j_pos[joint])
-        self._j_state_lock.release()
+                jpos.append(j_pos[joint])
         return jpos
 
     def get_jvel(self, joint_name=None):
@@ -238,16 +236,15 @@ class SingleArmROS(SingleArmReal):
             - list: joint velocities if joint_name is None
               (shape: :math:`[DOF]`).
         """
-        self._j_state_lock.acquire()
+        j_vel = self._j_vel
         if joint_name is not None:
             if joint_name not in self.arm_jnt_names:
                 raise TypeError('Joint name [%s] not recognized!' % joint_name)
-            jvel = self._j_vel[joint_name]
+            jvel = j_vel[joint_name]
         else:
             jvel = []
             for joint in self.arm_jnt_names:
-                jvel.append(self._j_vel[joint])
-        self._j_state_lock.release()
+                jvel.append(j_vel[joint])
         return jvel
 
     def get_ee_pose(self):
@@ -334,10 +331,12 @@ class SingleArmROS(SingleArmReal):
         self.max_vel = np.min(max_vels)
         self.max_acc = np.min(max_accs)
 
+        # the joint state dicts are never modified in place, the
+        # subscriber callback replaces them with updated copies,
+        # so readers can use them without locking
         self._j_pos = dict()
         self._j_vel = dict()
         self._j_torq = dict()
-        self._j_state_lock = threading.RLock()
         self.tf_listener = tf.TransformListener()
         rospy.Subscriber(self.cfgs.ARM.ROSTOPIC_JOINT_STATES, JointState,
                          self._callback_joint_states)
@@ -349,13 +348,18 @@ class SingleArmROS(SingleArmReal):
         Args:
             msg (sensor_msgs/JointState): Contains message published in topic.
         """
-        self._j_state_lock.acquire()
+        j_pos = dict(self._j_pos)
+        j_vel = dict(self._j_vel)
+        j_torq = dict(self._j_torq)
         for idx, name in enumerate(msg.name):
             if name in self.arm_jnt_names:
                 if idx < len(msg.position):
-                    self._j_pos[name] = msg.position[idx]
+                    j_pos[name] = msg.position[idx]
                 if idx < len(msg.velocity):
-                    self._j_vel[name] = msg.velocity[idx]
+                    j_vel[name] = msg.velocity[idx]
                 if idx < len(msg.effort):
-                    self._j_torq[name] = msg.effort[idx]
-        self._j_state_lock.release()
+                    j_torq[name] = msg.effort[idx]
+        # publish the new states with atomic reference assignments
+        self._j_pos = j_pos
+        self._j_vel = j_vel
+        self._j_torq = j_torq
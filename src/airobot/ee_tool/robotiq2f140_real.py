@@ -13,6 +13,9 @@ from control_msgs.msg import GripperCommandActionGoal
 from sensor_msgs.msg import JointState
 from std_msgs.msg import String
 
+# gripper position sent back by the UR controller (socket_send_int)
+_POS_STRUCT = struct.Struct('!i')
+
 
 class Robotiq2F140Real(EndEffectorTool):
     """
@@ -38,11 +41,12 @@ class Robotiq2F140Real(EndEffectorTool):
 
         self._gazebo_sim = rospy.get_param('sim')
         self._comm_initialized = False
-        self._get_state_lock = threading.RLock()
+        # latest gripper position, only ever rebound (atomically)
+        # by the joint state callback, so it's read without locking
+        self._gripper_data = None
         self._initialize_comm()
 
         if not self._gazebo_sim:
-            self._gripper_data = None
             self._pub_state_lock = threading.RLock()
 
             self._updated_gripper_pos = JointState()
@@ -148,10 +152,7 @@ class Robotiq2F140Real(EndEffectorTool):
         """
         Get the current position of the gripper.
         """
-        self._get_state_lock.acquire()
-        pos = self._gripper_data
-        self._get_state_lock.release()
-        return pos
+        return self._gripper_data
 
     def _get_current_pos_cb(self, msg):
         """
@@ -164,9 +165,7 @@ class Robotiq2F140Real(EndEffectorTool):
         if 'finger_joint' in msg.name:
             idx = msg.name.index('finger_joint')
             if idx < len(msg.position):
-                self._get_state_lock.acquire()
                 self._gripper_data = msg.position[idx]
-                self._get_state_lock.release()
 
     def _get_new_urscript(self):
         """
@@ -244,9 +243,11 @@ class Robotiq2F140Real(EndEffectorTool):
                 return
 
             data = conn.recv(buffer_size)
+            # each reply comes on its own connection from the controller
+            conn.close()
             if not data:
                 continue
-            returned_pos = int(struct.unpack('!i', data[0:4])[0])
+            returned_pos = _POS_STRUCT.unpack_from(data, 0)[0]
 
             if np.abs(returned_pos - last_returned_pos) < self._err_thresh:
                 equal_pos += 1
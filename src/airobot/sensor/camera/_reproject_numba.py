@@ -0,0 +1,69 @@
+"""
+Compiled depth image to point cloud reprojection. It is used by
+RGBDCamera.get_pcd when numba is installed, otherwise
+`reproject` is None and the numpy implementation is used instead.
+"""
+import threading
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is None:
+    reproject = None
+else:
+    # only allow FMA contraction, NaN depth values
+    # must still fail the depth range check
+    @njit(parallel=True, fastmath={'contract'}, cache=True)
+    def _reproject(depth, depth_scale, proj, trans, depth_min, depth_max,
+                   filter_depth, out_pts, out_mask):
+        """
+        Project every pixel of the depth image to a 3D point.
+
+        Args:
+            depth (np.ndarray): depth image (shape: :math:`[H, W]`).
+            depth_scale (float): ratio of the depth image value
+                to true depth value.
+            proj (np.ndarray): matrix (shape: :math:`[3, 3]`) that maps
+                [u, v, 1] to the ray of the pixel in the target frame,
+                i.e., the rotation of the target frame times
+                the inverse of the intrinsic matrix.
+            trans (np.ndarray): translation (shape: :math:`[3,]`)
+                of the target frame.
+            depth_min (float): minimum depth value.
+            depth_max (float): maximum depth value.
+            filter_depth (bool): if True, only pixels with depth values
+                in (depth_min, depth_max) are marked as valid.
+            out_pts (np.ndarray): output point coordinates
+                (shape: :math:`[H * W, 3]`).
+            out_mask (np.ndarray): output valid mask
+                (shape: :math:`[H * W,]`).
+        """
+        height, width = depth.shape
+        for i in prange(height):
+            for j in range(width):
+                idx = i * width + j
+                z = depth[i, j] * depth_scale
+                valid = not filter_depth or depth_min < z < depth_max
+                out_mask[idx] = valid
+                if valid:
+                    for r in range(3):
+                        out_pts[idx, r] = (proj[r, 0] * j +
+                                           proj[r, 1] * i +
+                                           proj[r, 2]) * z + trans[r]
+
+    # numba's workqueue threading layer aborts the process if parallel
+    # kernels are launched from several threads at once (e.g., ROS
+    # callbacks), so the launches are serialized
+    _reproject_lock = threading.Lock()
+
+    def reproject(depth, depth_scale, proj, trans, depth_min, depth_max,
+                  filter_depth, out_pts, out_mask):
+        """
+        Thread-safe wrapper of the compiled kernel, see _reproject
+        for the arguments.
+        """
+        with _reproject_lock:
+            _reproject(depth, depth_scale, proj, trans, depth_min,
+                       depth_max, filter_depth, out_pts, out_mask)
@@ -1,8 +1,96 @@
+from collections import OrderedDict
+
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy import ndimage
 
+from airobot.sensor.camera._reproject_numba import reproject
 from airobot.sensor.camera.camera import Camera
 
 
+def _odd_median(windows, axis):
+    """
+    Median along an axis with an odd number of elements. The median is
+    then the middle order statistic, which np.partition finds in linear
+    time instead of sorting the windows as np.median does.
+
+    Args:
+        windows (np.ndarray): input array.
+        axis (int): axis along which the median is computed.
+
+    Returns:
+        np.ndarray: median values.
+    """
+    mid = windows.shape[axis] // 2
+    return np.take(np.partition(windows, mid, axis=axis), mid, axis=axis)
+
+
+# (whole-image filter, per-window reduction) for each kernel type
+_KERNEL_FUNCS = {
+    'min': (ndimage.minimum_filter, np.min),
+    'max': (ndimage.maximum_filter, np.max),
+    'median': (ndimage.median_filter, _odd_median),
+    'mean': (ndimage.uniform_filter, np.mean),
+}
+
+
+# [u, v, 1] pixel grids shared by all cameras, keyed on (height, width)
+_UV_GRID_CACHE = OrderedDict()
+_UV_GRID_CACHE_SIZE = 4
+
+
+def _get_uv_one(height, width):
+    """
+    Return the homogeneous pixel coordinates of all the pixels
+    in an image. The grid is cached and shared across cameras
+    with the same image size, so it's read-only.
+
+    Args:
+        height (int): height of the image.
+        width (int): width of the image.
+
+    Returns:
+        np.ndarray: [u, v, 1] of each pixel (shape: :math:`[3, H * W]`).
+    """
+    key = (height, width)
+    uv_one = _UV_GRID_CACHE.pop(key, None)
+    if uv_one is None:
+        us, vs = np.meshgrid(np.arange(width, dtype=np.float32),
+                             np.arange(height, dtype=np.float32),
+                             indexing='xy')
+        uv_one = np.stack((us.ravel(), vs.ravel(),
+                           np.ones(height * width, dtype=np.float32)))
+        uv_one.setflags(write=False)
+        if len(_UV_GRID_CACHE) >= _UV_GRID_CACHE_SIZE:
+            _UV_GRID_CACHE.popitem(last=False)
+    # (re)insert as the most recently used entry
+    _UV_GRID_CACHE[key] = uv_one
+    return uv_one
+
+
+def _pix_windows(im, rs, cs, k):
+    """
+    Gather the k x k windows centered at the specified pixels.
+    The image is padded by repeating the edge pixels, which
+    matches the scipy.ndimage filters with mode='nearest'.
+
+    Args:
+        im (np.ndarray): image (shape: :math:`[H, W]`).
+        rs (list or np.ndarray): row indices (shape: :math:`[N,]`).
+        cs (list or np.ndarray): column indices (shape: :math:`[N,]`).
+        k (int): kernel size (odd).
+
+    Returns:
+        np.ndarray: flattened windows (shape: :math:`[N, k * k]`).
+    """
+    padded = np.pad(im, k // 2, mode='edge')
+    windows = as_strided(padded,
+                         shape=im.shape + (k, k),
+                         strides=padded.strides * 2,
+                         writeable=False)
+    return windows[rs, cs].reshape(len(rs), -1)
+
+
 class RGBDCamera(Camera):
     """
     A RGBD camera.
@@ -44,12 +132,11 @@ class RGBDCamera(Camera):
         """
         self.cam_int_mat_inv = np.linalg.inv(self.cam_int_mat)
 
-        img_pixs = np.mgrid[0: self.img_height,
-                            0: self.img_width].reshape(2, -1)
-        img_pixs[[0, 1], :] = img_pixs[[1, 0], :]
-        self._uv_one = np.concatenate((img_pixs,
-                                       np.ones((1, img_pixs.shape[1]))))
-        self._uv_one_in_cam = np.dot(self.cam_int_mat_inv, self._uv_one)
+        self._uv_one = _get_uv_one(self.img_height, self.img_width)
+        # rays of all the pixels in camera frame, stored row-major
+        # (shape: [H * W, 3]) so that masking gathers contiguous rows
+        self._rays = np.dot(self._uv_one.T,
+                            self.cam_int_mat_inv.T.astype(np.float32))
 
     def get_cam_ext(self):
         """
@@ -98,7 +185,10 @@ class RGBDCamera(Camera):
                method will be applied to use some statistical value
                (such as minimum, maximum, median, mean) of all the depth
                values in the slicing window as a more robust estimate of
-               the depth value of the specified pixels.
+               the depth value of the specified pixels. Near the image
+               border, the window is filled by repeating the edge pixels.
+               A window that contains NaN (invalid) depth values gives
+               NaN, which is dropped if filter_depth is True.
             ktype (str): what kind of statistical value of all the depth
                values in the sliced kernel
                to use as a proxy of the depth value at specified pixels.
@@ -110,7 +200,8 @@ class RGBDCamera(Camera):
 
         Returns:
             np.ndarray: 3D point coordinates of the pixels in
-            camera frame (shape: :math:`[N, 3]`).
+            the world frame or in the camera frame
+            (shape: :math:`[N, 3]`, dtype: np.float32).
         """
         if not isinstance(rs, int) and not isinstance(rs, list) and \
                 not isinstance(rs, np.ndarray):
@@ -128,58 +219,107 @@ class RGBDCamera(Camera):
             cs = cs.flatten()
         if not (isinstance(k, int) and (k % 2) == 1):
             raise TypeError('k should be a positive odd integer.')
-        _, depth_im = self.get_images(get_rgb=False, get_depth=True)
+        _, depth_im = self.get_images(get_rgb=False, get_depth=True,
+                                      reuse_buffers=True)
+        depth_min = depth_min if depth_min else self.depth_min
+        depth_max = depth_max if depth_max else self.depth_max
+        if k == 1 and len(rs) == 1:
+            return self._get_single_pix_3dpt(depth_im, rs[0], cs[0],
+                                             in_world=in_world,
+                                             filter_depth=filter_depth,
+                                             depth_min=depth_min,
+                                             depth_max=depth_max)
         if k == 1:
             depth_im = depth_im[rs, cs]
         else:
-            depth_im_list = []
-            if ktype == 'min':
-                ktype_func = np.min
-            elif ktype == 'max':
-                ktype_func = np.max
-            elif ktype == 'median':
-                ktype_func = np.median
-            elif ktype == 'mean':
-                ktype_func = np.mean
-            else:
+            if ktype not in _KERNEL_FUNCS:
                 raise TypeError('Unsupported ktype:[%s]' % ktype)
-            for r, c in zip(rs, cs):
-                s = k // 2
-                rmin = max(0, r - s)
-                rmax = min(self.img_height, r + s + 1)
-                cmin = max(0, c - s)
-                cmax = min(self.img_width, c + s + 1)
-                depth_im_list.append(ktype_func(depth_im[rmin:rmax,
-                                                cmin:cmax]))
-            depth_im = np.array(depth_im_list)
-
-        depth = depth_im.reshape(-1) * self.depth_scale
-        img_pixs = np.stack((rs, cs)).reshape(2, -1)
-        img_pixs[[0, 1], :] = img_pixs[[1, 0], :]
-        depth_min = depth_min if depth_min else self.depth_min
-        depth_max = depth_max if depth_max else self.depth_max
+            filter_func, reduce_func = _KERNEL_FUNCS[ktype]
+            if len(rs) * k * k < depth_im.size:
+                # only a few pixels are queried, so it's cheaper
+                # to reduce their windows than to filter the whole image
+                windows = _pix_windows(depth_im, rs, cs, k)
+                nan_wins = np.isnan(windows).any(axis=1)
+                depth_im = reduce_func(windows, axis=1)
+            else:
+                # the ndimage filters don't handle NaN (invalid depth)
+                # consistently, or spread it beyond its windows, so
+                # the NaN windows are found separately
+                nan_pix = np.isnan(depth_im)
+                if nan_pix.any():
+                    nan_wins = ndimage.maximum_filter(nan_pix, size=k,
+                                                      mode='nearest')[rs, cs]
+                    depth_im = np.where(nan_pix, 0, depth_im)
+                else:
+                    nan_wins = nan_pix[rs, cs]
+                if ktype == 'mean':
+                    depth_im = depth_im.astype(np.float64)
+                depth_im = filter_func(depth_im, size=k,
+                                       mode='nearest')[rs, cs]
+            # a window with any NaN depth value gives NaN,
+            # as np.median and the other reductions do
+            if nan_wins.any():
+                depth_im = depth_im.astype(np.float32)
+                depth_im[nan_wins] = np.nan
+
+        depth = depth_im.reshape(-1).astype(np.float32, copy=False)
+        depth = depth * np.float32(self.depth_scale)
+        # reuse the precomputed rays instead of applying
+        # the inverse intrinsic matrix on every call
+        pix_ids = np.ravel_multi_index((rs, cs),
+                                       (self.img_height, self.img_width))
+        rays = self._rays[pix_ids]
         if filter_depth:
-            valid = depth > depth_min
-            valid = np.logical_and(valid,
-                                   depth < depth_max)
-            depth = depth[:, valid]
-            img_pixs = img_pixs[:, valid]
-        uv_one = np.concatenate((img_pixs,
-                                 np.ones((1, img_pixs.shape[1]))))
-        uv_one_in_cam = np.dot(self.cam_int_mat_inv, uv_one)
-        pts_in_cam = np.multiply(uv_one_in_cam, depth)
+            valid = (depth > depth_min) & (depth < depth_max)
+            depth = depth[valid]
+            rays = rays[valid]
+        pts_in_cam = rays * depth[:, None]
         if in_world:
             if self.cam_ext_mat is None:
                 raise ValueError('Please call set_cam_ext() first to set up'
                                  ' the camera extrinsic matrix')
-            pts_in_cam = np.concatenate((pts_in_cam,
-                                         np.ones((1, pts_in_cam.shape[1]))),
-                                        axis=0)
-            pts_in_world = np.dot(self.cam_ext_mat, pts_in_cam)
-            pts_in_world = pts_in_world[:3, :].T
-            return pts_in_world
+            return self._cam_to_world(pts_in_cam)
         else:
-            return pts_in_cam.T
+            return pts_in_cam
+
+    def _get_single_pix_3dpt(self, depth_im, r, c, in_world, filter_depth,
+                             depth_min, depth_max):
+        """
+        Calculate the 3D position of a single pixel. It does the same
+        as get_pix_3dpt with k=1, but with scalar math, which is much
+        cheaper than the array operations for a single pixel.
+
+        Args:
+            depth_im (np.ndarray): depth image (shape: :math:`[H, W]`).
+            r (int): row of the pixel.
+            c (int): column of the pixel.
+            in_world (bool): if True, return the 3D position in
+                the world frame. Otherwise, return the 3D position in
+                the camera frame.
+            filter_depth (bool): if True, the pixel is dropped if its
+                depth value is not between [depth_min, depth_max].
+            depth_min (float): minimum depth value.
+            depth_max (float): maximum depth value.
+
+        Returns:
+            np.ndarray: 3D point coordinates of the pixel
+            (shape: :math:`[1, 3]`, or :math:`[0, 3]` if it's dropped).
+        """
+        z = float(depth_im[r, c]) * self.depth_scale
+        if filter_depth and not depth_min < z < depth_max:
+            return np.empty((0, 3), dtype=np.float32)
+        pix_id = np.ravel_multi_index((r, c),
+                                      (self.img_height, self.img_width))
+        ray_x, ray_y, ray_z = self._rays[pix_id].tolist()
+        pt = [ray_x * z, ray_y * z, ray_z * z]
+        if in_world:
+            if self.cam_ext_mat is None:
+                raise ValueError('Please call set_cam_ext() first to set up'
+                                 ' the camera extrinsic matrix')
+            ext_mat = self.cam_ext_mat.tolist()
+            pt = [row[0] * pt[0] + row[1] * pt[1] + row[2] * pt[2] + row[3]
+                  for row in ext_mat[:3]]
+        return np.array([pt], dtype=np.float32)
 
     def get_pcd(self, in_world=True, filter_depth=True,
                 depth_min=None, depth_max=None):
@@ -200,40 +340,114 @@ class RGBDCamera(Camera):
         Returns:
             2-element tuple containing
 
-            - np.ndarray: point coordinates (shape: :math:`[N, 3]`).
+            - np.ndarray: point coordinates (shape: :math:`[N, 3]`,
+              dtype: np.float32).
             - np.ndarray: rgb values (shape: :math:`[N, 3]`).
         """
-        rgb_im, depth_im = self.get_images(get_rgb=True, get_depth=True)
-        # pcd in camera from depth
-        depth = depth_im.reshape(-1) * self.depth_scale
+        rgb_im, depth_im = self.get_images(get_rgb=True, get_depth=True,
+                                           reuse_buffers=True)
         rgb = None
         if rgb_im is not None:
             rgb = rgb_im.reshape(-1, 3)
+            if not filter_depth:
+                # rgb_im can be a reused buffer, and it's not copied
+                # by the (skipped) masking below
+                rgb = rgb.copy()
         depth_min = depth_min if depth_min else self.depth_min
         depth_max = depth_max if depth_max else self.depth_max
+        if in_world and self.cam_ext_mat is None:
+            raise ValueError('Please call set_cam_ext() first to set up'
+                             ' the camera extrinsic matrix')
+        if reproject is not None:
+            pcd_pts, valid_ids = self._reproject_numba(depth_im, in_world,
+                                                       filter_depth,
+                                                       depth_min, depth_max)
+            pcd_rgb = rgb
+            if filter_depth and rgb is not None:
+                pcd_rgb = rgb.take(valid_ids, axis=0)
+            return pcd_pts, pcd_rgb
+        # pcd in camera from depth
+        depth = depth_im.ravel().astype(np.float32, copy=False)
+        depth = depth * np.float32(self.depth_scale)
         if filter_depth:
-            valid = depth > depth_min
-            valid = np.logical_and(valid,
-                                   depth < depth_max)
-            depth = depth[valid]
+            valid = (depth > depth_min) & (depth < depth_max)
+            # find the valid pixels once and gather all the arrays
+            # with their indices, which only touches the valid rows
+            valid_ids = np.flatnonzero(valid)
+            depth = depth.take(valid_ids)
             if rgb is not None:
-                rgb = rgb[valid]
-            uv_one_in_cam = self._uv_one_in_cam[:, valid]
+                rgb = rgb.take(valid_ids, axis=0)
+            rays = self._rays.take(valid_ids, axis=0)
         else:
-            uv_one_in_cam = self._uv_one_in_cam
-        pts_in_cam = np.multiply(uv_one_in_cam, depth)
+            rays = self._rays
+        pts_in_cam = rays * depth[:, None]
         if not in_world:
-            pcd_pts = pts_in_cam.T
+            pcd_pts = pts_in_cam
             pcd_rgb = rgb
             return pcd_pts, pcd_rgb
         else:
-            if self.cam_ext_mat is None:
-                raise ValueError('Please call set_cam_ext() first to set up'
-                                 ' the camera extrinsic matrix')
-            pts_in_cam = np.concatenate((pts_in_cam,
-                                         np.ones((1, pts_in_cam.shape[1]))),
-                                        axis=0)
-            pts_in_world = np.dot(self.cam_ext_mat, pts_in_cam)
-            pcd_pts = pts_in_world[:3, :].T
+            pcd_pts = self._cam_to_world(pts_in_cam)
             pcd_rgb = rgb
             return pcd_pts, pcd_rgb
+
+    def _cam_to_world(self, pts_in_cam):
+        """
+        Transform points from the camera frame to the world frame.
+        The rotation and translation are applied directly instead
+        of using homogeneous coordinates.
+
+        Args:
+            pts_in_cam (np.ndarray): point coordinates in the camera
+                frame (shape: :math:`[N, 3]`).
+
+        Returns:
+            np.ndarray: point coordinates in the world
+            frame (shape: :math:`[N, 3]`, dtype: np.float32).
+        """
+        # keep the points in float32 in the world frame too,
+        # which is precise enough at camera depth ranges
+        ext_mat = self.cam_ext_mat.astype(np.float32)
+        pts_in_world = np.dot(pts_in_cam, ext_mat[:3, :3].T)
+        pts_in_world += ext_mat[:3, 3]
+        return pts_in_world
+
+    def _reproject_numba(self, depth_im, in_world, filter_depth,
+                         depth_min, depth_max):
+        """
+        Project the depth image to a point cloud with the
+        compiled numba kernel.
+
+        Args:
+            depth_im (np.ndarray): depth image (shape: :math:`[H, W]`).
+            in_world (bool): return points in the world frame, otherwise,
+                return points in the camera frame.
+            filter_depth (bool): only keep the points with depth values
+                lying in [depth_min, depth_max].
+            depth_min (float): minimum depth value.
+            depth_max (float): maximum depth value.
+
+        Returns:
+            2-element tuple containing
+
+            - np.ndarray: point coordinates (shape: :math:`[N, 3]`).
+            - np.ndarray: indices of the valid pixels (shape: :math:`[N,]`),
+              None if filter_depth is False.
+        """
+        # the outputs are allocated per call, so that
+        # concurrent calls don't share them
+        pts = np.empty((depth_im.size, 3), dtype=np.float32)
+        mask = np.empty(depth_im.size, dtype=np.bool_)
+        if in_world:
+            proj = np.dot(self.cam_ext_mat[:3, :3], self.cam_int_mat_inv)
+            trans = self.cam_ext_mat[:3, 3].astype(np.float64)
+        else:
+            proj = self.cam_int_mat_inv
+            trans = np.zeros(3)
+        reproject(depth_im, float(self.depth_scale),
+                  np.ascontiguousarray(proj, dtype=np.float64), trans,
+                  float(depth_min), float(depth_max), filter_depth,
+                  pts, mask)
+        if not filter_depth:
+            return pts, None
+        valid_ids = np.flatnonzero(mask)
+        return pts.take(valid_ids, axis=0), valid_ids
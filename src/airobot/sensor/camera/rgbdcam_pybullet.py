@@ -1,3 +1,5 @@
+import threading
+
 import numpy as np
 
 from airobot.sensor.camera.rgbdcam import RGBDCamera
@@ -22,6 +24,11 @@ class RGBDCameraPybullet(RGBDCamera):
         super(RGBDCameraPybullet, self).__init__(cfgs=cfgs)
         self.view_matrix = None
         self.proj_matrix = None
+        self._view_matrix_flat = None
+        self._proj_matrix_flat = None
+        # the reused image buffers are per thread, so that get_pcd
+        # and get_pix_3dpt stay safe to call from several threads
+        self._img_bufs = threading.local()
         self.depth_scale = 1
         self.depth_min = self.cfgs.CAM.SIM.ZNEAR
         self.depth_max = self.cfgs.CAM.SIM.ZFAR
@@ -57,6 +64,8 @@ class RGBDCameraPybullet(RGBDCamera):
                                                         roll,
                                                         upAxisIndex=2)
         self.view_matrix = np.array(vm).reshape(4, 4)
+        # flattened matrices passed to pybullet in get_images
+        self._view_matrix_flat = tuple(vm)
         self.img_height = height if height else self.cfgs.CAM.SIM.HEIGHT
         self.img_width = width if width else self.cfgs.CAM.SIM.WIDTH
         aspect = self.img_width / float(self.img_height)
@@ -68,6 +77,7 @@ class RGBDCameraPybullet(RGBDCamera):
                                                  znear,
                                                  zfar)
         self.proj_matrix = np.array(pm).reshape(4, 4)
+        self._proj_matrix_flat = tuple(pm)
         rot = np.array([[1, 0, 0, 0],
                         [0, -1, 0, 0],
                         [0, 0, -1, 0],
@@ -87,7 +97,7 @@ class RGBDCameraPybullet(RGBDCamera):
         self._init_pers_mat()
 
     def get_images(self, get_rgb=True, get_depth=True,
-                   get_seg=False, **kwargs):
+                   get_seg=False, reuse_buffers=False, **kwargs):
         """
         Return rgb, depth, and segmentation images.
 
@@ -96,6 +106,12 @@ class RGBDCameraPybullet(RGBDCamera):
             get_depth (bool): return depth image if True, None otherwise.
             get_seg (bool): return the segmentation mask if True,
                 None otherwise.
+            reuse_buffers (bool): if True, the rgb and depth images
+                are written into buffers that are reused across calls
+                instead of newly allocated ones. The returned images
+                will then be overwritten by the next call with
+                `reuse_buffers=True` from the same thread, so only
+                use it if the images are not kept.
 
         Returns:
             2-element tuple (if `get_seg` is False) containing
@@ -126,8 +142,8 @@ class RGBDCameraPybullet(RGBDCamera):
         cam_img_kwargs = {
             'width': self.img_width,
             'height': self.img_height,
-            'viewMatrix': self.view_matrix.flatten(),
-            'projectionMatrix': self.proj_matrix.flatten(),
+            'viewMatrix': self._view_matrix_flat,
+            'projectionMatrix': self._proj_matrix_flat,
             'flags': self._pb.ER_NO_SEGMENTATION_MASK,
             'renderer': renderer
         }
@@ -140,18 +156,55 @@ class RGBDCameraPybullet(RGBDCamera):
         rgb = None
         depth = None
         if get_rgb:
-            rgb = np.reshape(images[2],
-                             (self.img_height,
-                              self.img_width, 4))[:, :, :3]  # 0 to 255
+            rgba = np.reshape(images[2],
+                              (self.img_height,
+                               self.img_width, 4))
+            # copy out a contiguous rgb image once, so reshaping
+            # it later (e.g. in get_pcd) doesn't copy again
+            if reuse_buffers:
+                rgb = self._get_img_buf('rgb', rgba.shape[:2] + (3,),
+                                        rgba.dtype)
+                np.copyto(rgb, rgba[:, :, :3])  # 0 to 255
+            else:
+                rgb = np.ascontiguousarray(rgba[:, :, :3])  # 0 to 255
         if get_depth:
             depth_buffer = np.reshape(images[3], [self.img_height,
                                                   self.img_width])
             znear = self.cfgs.CAM.SIM.ZNEAR
             zfar = self.cfgs.CAM.SIM.ZFAR
-            depth = zfar * znear / (zfar - (zfar - znear) * depth_buffer)
+            # depth = zfar * znear / (zfar - (zfar - znear) * depth_buffer),
+            # computed in place to avoid allocating temporary images
+            if reuse_buffers:
+                depth = self._get_img_buf('depth', depth_buffer.shape,
+                                          depth_buffer.dtype)
+                np.multiply(depth_buffer, znear - zfar, out=depth)
+            else:
+                depth = depth_buffer * (znear - zfar)
+            depth += zfar
+            np.divide(zfar * znear, depth, out=depth)
         if get_seg:
             seg = np.reshape(images[4], [self.img_height,
                                          self.img_width])
             return rgb, depth, seg
         else:
             return rgb, depth
+
+    def _get_img_buf(self, name, shape, dtype):
+        """
+        Return the reusable image buffer of the calling thread with
+        the given name. It's (re)allocated if the requested shape or
+        dtype changes.
+
+        Args:
+            name (str): name of the buffer.
+            shape (tuple): shape of the buffer.
+            dtype (np.dtype): data type of the buffer.
+
+        Returns:
+            np.ndarray: image buffer (uninitialized if newly allocated).
+        """
+        buf = getattr(self._img_bufs, name, None)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            setattr(self._img_bufs, name, buf)
+        return buf
@@ -1,6 +1,5 @@
 import threading
 import time
-from copy import deepcopy
 
 import airobot as ar
 import message_filters
@@ -161,13 +160,17 @@ class RGBDCameraReal(RGBDCamera):
             cam_mat[:3, 3] = pos.flatten()
             self.cam_ext_mat = cam_mat
 
-    def get_images(self, get_rgb=True, get_depth=True, **kwargs):
+    def get_images(self, get_rgb=True, get_depth=True,
+                   reuse_buffers=False, **kwargs):
         """
         Return rgb/depth images.
 
         Args:
             get_rgb (bool): return rgb image if True, None otherwise.
             get_depth (bool): return depth image if True, None otherwise.
+            reuse_buffers (bool): if True, the latest received images
+                are returned without being copied, so they must
+                not be modified.
 
         Returns:
             2-element tuple containing
@@ -177,10 +180,18 @@ class RGBDCameraReal(RGBDCamera):
         """
         rgb_img = None
         depth_img = None
+        # the callback always replaces the images with new arrays
+        # instead of writing into them, so it's enough to grab the
+        # references under the lock and copy them after releasing it
         self._cam_img_lock.acquire()
         if get_rgb:
-            rgb_img = deepcopy(self._rgb_img)
+            rgb_img = self._rgb_img
         if get_depth:
-            depth_img = deepcopy(self._depth_img)
+            depth_img = self._depth_img
         self._cam_img_lock.release()
+        if not reuse_buffers:
+            if rgb_img is not None:
+                rgb_img = rgb_img.copy()
+            if depth_img is not None:
+                depth_img = depth_img.copy()
         return rgb_img, depth_img
@@ -0,0 +1,208 @@
+import threading
+
+import numpy as np
+import pytest
+
+from airobot.sensor.camera import rgbdcam
+from airobot.sensor.camera.rgbdcam import RGBDCamera
+
+HEIGHT, WIDTH = 48, 64
+# pixels far enough from the border for 5 x 5 windows
+INTERIOR_RS, INTERIOR_CS = np.meshgrid(np.arange(2, HEIGHT - 2),
+                                       np.arange(2, WIDTH - 2),
+                                       indexing='ij')
+INTERIOR_RS = INTERIOR_RS.ravel()
+INTERIOR_CS = INTERIOR_CS.ravel()
+
+
+class StubRGBDCamera(RGBDCamera):
+    """
+    RGBD camera that always returns the same images,
+    so it runs without pybullet or ROS.
+    """
+
+    def __init__(self, rgb_im, depth_im):
+        super(StubRGBDCamera, self).__init__(cfgs=None)
+        self.rgb_im = rgb_im
+        self.depth_im = depth_im
+        self.img_height, self.img_width = depth_im.shape
+        self.cam_int_mat = np.array([[50., 0., 32.],
+                                     [0., 55., 24.],
+                                     [0., 0., 1.]])
+        self.cam_ext_mat = np.eye(4)
+        self.cam_ext_mat[:3, :3] = np.array([[0., -1., 0.],
+                                             [1., 0., 0.],
+                                             [0., 0., 1.]])
+        self.cam_ext_mat[:3, 3] = [1., 2., 3.]
+        self.depth_scale = 1.0
+        self.depth_min = 0.5
+        self.depth_max = 5.0
+        self._init_pers_mat()
+
+    def get_images(self, get_rgb=True, get_depth=True, **kwargs):
+        rgb = self.rgb_im.copy() if get_rgb else None
+        depth = self.depth_im.copy() if get_depth else None
+        return rgb, depth
+
+
+@pytest.fixture
+def camera():
+    rng = np.random.RandomState(0)
+    depth_im = rng.uniform(0.1, 6.0, (HEIGHT, WIDTH)).astype(np.float32)
+    rgb_im = rng.randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8)
+    return StubRGBDCamera(rgb_im, depth_im)
+
+
+@pytest.fixture(params=['numpy', 'numba'])
+def backend(request, monkeypatch):
+    if request.param == 'numba':
+        if rgbdcam.reproject is None:
+            pytest.skip('numba is not installed')
+    else:
+        monkeypatch.setattr(rgbdcam, 'reproject', None)
+    return request.param
+
+
+def ref_pts(cam, rs, cs, depth, in_world):
+    """
+    Reference 3D points of pixels with homogeneous coordinates in float64.
+    """
+    depth = np.asarray(depth, dtype=np.float64) * cam.depth_scale
+    uv_one = np.stack((cs, rs, np.ones(len(rs)))).astype(np.float64)
+    pts = np.dot(np.linalg.inv(cam.cam_int_mat), uv_one) * depth
+    if in_world:
+        pts = np.dot(cam.cam_ext_mat, np.vstack((pts, np.ones(len(rs)))))
+        pts = pts[:3]
+    return pts.T
+
+
+def ref_window_depth(depth_im, rs, cs, k, ktype):
+    """
+    Reference kernel depth values of interior pixels.
+    """
+    funcs = {'min': np.min, 'max': np.max,
+             'median': np.median, 'mean': np.mean}
+    h = k // 2
+    return np.array([funcs[ktype](depth_im[r - h:r + h + 1, c - h:c + h + 1])
+                     for r, c in zip(rs, cs)])
+
+
+@pytest.mark.parametrize('in_world', [True, False])
+@pytest.mark.parametrize('filter_depth', [True, False])
+def test_get_pcd(camera, backend, in_world, filter_depth):
+    pts, colors = camera.get_pcd(in_world=in_world,
+                                 filter_depth=filter_depth)
+    rs, cs = np.indices((HEIGHT, WIDTH)).reshape(2, -1)
+    depth = camera.depth_im.ravel()
+    rgb = camera.rgb_im.reshape(-1, 3)
+    if filter_depth:
+        valid = (depth > camera.depth_min) & (depth < camera.depth_max)
+        rs, cs, depth, rgb = rs[valid], cs[valid], depth[valid], rgb[valid]
+    assert pts.dtype == np.float32
+    assert pts.shape == (len(depth), 3)
+    np.testing.assert_allclose(pts, ref_pts(camera, rs, cs, depth, in_world),
+                               rtol=1e-5, atol=1e-5)
+    np.testing.assert_array_equal(colors, rgb)
+
+
+def test_get_pcd_threads(backend):
+    rng = np.random.RandomState(1)
+    cams = [StubRGBDCamera(
+        rng.randint(0, 256, (HEIGHT, WIDTH, 3)).astype(np.uint8),
+        rng.uniform(0.1, 6.0, (HEIGHT, WIDTH)).astype(np.float32))
+        for _ in range(4)]
+    refs = [cam.get_pcd()[0] for cam in cams]
+    mismatches = []
+
+    def run(cam, ref):
+        for _ in range(50):
+            if not np.array_equal(cam.get_pcd()[0], ref):
+                mismatches.append(cam)
+
+    threads = [threading.Thread(target=run, args=(cam, ref))
+               for cam, ref in zip(cams, refs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not mismatches
+
+
+@pytest.mark.parametrize('in_world', [True, False])
+@pytest.mark.parametrize('filter_depth', [True, False])
+def test_get_pix_3dpt_single(camera, in_world, filter_depth):
+    for r, c in [(0, 0), (10, 20), (HEIGHT - 1, WIDTH - 1)]:
+        pts = camera.get_pix_3dpt(r, c, in_world=in_world,
+                                  filter_depth=filter_depth)
+        depth = camera.depth_im[r, c]
+        assert pts.dtype == np.float32
+        if filter_depth and not camera.depth_min < depth < camera.depth_max:
+            assert pts.shape == (0, 3)
+            continue
+        np.testing.assert_allclose(pts,
+                                   ref_pts(camera, [r], [c], [depth],
+                                           in_world),
+                                   rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('ktype', ['median', 'min', 'max', 'mean'])
+@pytest.mark.parametrize('k', [1, 3, 5])
+@pytest.mark.parametrize('in_world', [True, False])
+def test_get_pix_3dpt_kernel(camera, ktype, k, in_world):
+    # a few pixels reduce their own windows, while many
+    # pixels filter the whole image, both must match
+    few = slice(0, 200, 17)
+    for rs, cs in [(INTERIOR_RS[few], INTERIOR_CS[few]),
+                   (INTERIOR_RS, INTERIOR_CS)]:
+        pts = camera.get_pix_3dpt(rs, cs, in_world=in_world,
+                                  k=k, ktype=ktype)
+        depth = ref_window_depth(camera.depth_im, rs, cs, k, ktype)
+        assert pts.dtype == np.float32
+        np.testing.assert_allclose(pts,
+                                   ref_pts(camera, rs, cs, depth, in_world),
+                                   rtol=1e-5, atol=1e-5)
+
+
+def test_get_pix_3dpt_filter_depth(camera):
+    rs, cs = INTERIOR_RS[::7], INTERIOR_CS[::7]
+    pts = camera.get_pix_3dpt(rs, cs, in_world=False, filter_depth=True,
+                              k=3, ktype='median')
+    depth = ref_window_depth(camera.depth_im, rs, cs, 3, 'median')
+    valid = (depth > camera.depth_min) & (depth < camera.depth_max)
+    np.testing.assert_allclose(pts,
+                               ref_pts(camera, rs[valid], cs[valid],
+                                       depth[valid], False),
+                               rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize('ktype', ['median', 'min', 'max', 'mean'])
+@pytest.mark.parametrize('filter_depth', [True, False])
+def test_get_pix_3dpt_nan_window(camera, ktype, filter_depth):
+    camera.depth_im[10, 20] = np.nan
+    r, c = 11, 21
+    one = camera.get_pix_3dpt(r, c, in_world=False,
+                              filter_depth=filter_depth,
+                              k=3, ktype=ktype)
+    # the window branch for the first query, the
+    # whole-image filter branch for the second one
+    many = camera.get_pix_3dpt(np.append(INTERIOR_RS, r),
+                               np.append(INTERIOR_CS, c),
+                               in_world=False, filter_depth=filter_depth,
+                               k=3, ktype=ktype)
+    if filter_depth:
+        assert one.shape == (0, 3)
+    else:
+        assert np.isnan(one).all()
+        assert np.isnan(many[-1]).all()
+    # the NaN pixel only affects the windows it falls in
+    for rs, cs in [(INTERIOR_RS[::5], INTERIOR_CS[::5]),
+                   (INTERIOR_RS, INTERIOR_CS)]:
+        pts = camera.get_pix_3dpt(rs, cs, in_world=False,
+                                  filter_depth=filter_depth,
+                                  k=3, ktype=ktype)
+        depth = ref_window_depth(camera.depth_im, rs, cs, 3, ktype)
+        if filter_depth:
+            valid = (depth > camera.depth_min) & (depth < camera.depth_max)
+            rs, cs, depth = rs[valid], cs[valid], depth[valid]
+        np.testing.assert_allclose(pts, ref_pts(camera, rs, cs, depth, False),
+                                   rtol=1e-5, atol=1e-5)